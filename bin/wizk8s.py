@@ -1,23 +1,20 @@
 #!/usr/bin/env python3
 
+# Only cheap, always-needed modules are imported here. Slow or
+# command-specific ones (yaml, dotenv, kubernetes, ...) are imported in the
+# functions that use them, so quick commands like `info` start fast.
+from dataclasses import dataclass
 from functools import cache
-import json
 import os
-import random
 import string
 import subprocess
 import sys
-from base64 import b64decode
-from collections import defaultdict
 from pathlib import Path
-from subprocess import CalledProcessError, check_call
-from tempfile import NamedTemporaryFile
-from typing import Dict, List, Optional, TypedDict
+from subprocess import CalledProcessError
+from typing import Dict, List, Optional, Tuple, TypedDict
 
 import click
 import click.exceptions
-import yaml
-from dotenv import dotenv_values
 
 GLOBALS = {
     "verbose": False
@@ -44,20 +41,48 @@ class MntSecretFileMeta(TypedDict):
 VOL_MNT_WHITELIST = '-' + string.ascii_lowercase + string.digits
 
 
+class _VolMntSlugTable(dict):
+    """
+    `str.translate` table: whitelisted chars map to themselves, anything
+    else (including non-ascii) becomes '-'
+    """
+
+    def __missing__(self, codepoint):
+        return '-'
+
+
+_VOL_MNT_SLUG_TABLE = _VolMntSlugTable((ord(c), c) for c in VOL_MNT_WHITELIST)
+
+# Seconds to wait on quick lookups (API reads, kubectl config, etc.)
+METADATA_CMD_TIMEOUT = 30
+
+# Seconds to wait on API writes, which may carry a whole secretfiles dir
+API_WRITE_TIMEOUT = 60
+
+# Most apiserver requests we keep in flight at once
+MAX_PARALLEL_API_CALLS = 10
+
+
 # UTILS
 
 def verbose_print(*args, **kwargs):
     if GLOBALS["verbose"]:
         print(*args, **kwargs)
 
-def exec(*args):
+def exec(*args, **kwargs):
+    """
+    Run a command with its output going straight to the terminal
+    """
     verbose_print(f"Running command: {args}")
-    return check_call(args)
+    return subprocess.run(args, check=True, **kwargs)
 
 
 def exec_io(*args, **kwargs):
+    """
+    Run a quick command and capture its output
+    """
     verbose_print(f"Running io command: {args}")
-    proc = subprocess.run(args, capture_output=True, timeout=30, **kwargs)
+    proc = subprocess.run(args, capture_output=True, timeout=METADATA_CMD_TIMEOUT, **kwargs)
     try:
         proc.check_returncode()
     except CalledProcessError:
@@ -65,19 +90,73 @@ def exec_io(*args, **kwargs):
     return proc.stdout
 
 
-def _is_extant_k8s_item(item_type: str, item_name: str):
-    proc = subprocess.run([
-        'kubectl', 'get', item_type, item_name
-    ], capture_output=True, timeout=30)
-    if proc.returncode == 0:
-        return True
-    if 'Error from server (NotFound)' in proc.stderr.decode('utf8'):
-        return False
-    proc.check_returncode()  # Something else broke
+@cache
+def _yaml_safe_io():
+    """
+    The yaml module and its safe Loader/Dumper, using the libyaml
+    bindings when PyYAML was built with them
+    """
+    import yaml
+    try:
+        from yaml import CSafeDumper as SafeDumper
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeDumper, SafeLoader
+    return yaml, SafeLoader, SafeDumper
 
 
-def _is_extant_secret(secret_name) -> bool:
-    return _is_extant_k8s_item('secret', secret_name)
+def yaml_load(stream):
+    yaml, SafeLoader, _ = _yaml_safe_io()
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def yaml_dump(data, stream, **kwargs):
+    yaml, _, SafeDumper = _yaml_safe_io()
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)
+
+
+@cache
+def _get_k8s_client():
+    """
+    Load kubeconfig (and authenticate) once; all API calls share the
+    returned CoreV1Api
+    """
+    from kubernetes import client as k8s_client
+    from kubernetes import config as k8s_config
+    from urllib3 import Retry
+    configuration = k8s_client.Configuration()
+    k8s_config.load_kube_config(client_configuration=configuration)
+    # Enough pooled connections for all the parallel requests
+    configuration.connection_pool_maxsize = 2 * MAX_PARALLEL_API_CALLS
+    # Once retries run out, hand back the last response so it surfaces as
+    # an ApiException (with the apiserver's error body), not MaxRetryError
+    configuration.retries = Retry(
+        total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False)
+    return k8s_client.CoreV1Api(k8s_client.ApiClient(configuration))
+
+
+def _is_extant_k8s_item(namespace: str, item_type: str, item_name: str) -> bool:
+    """
+    Get just the one item, so only `get` on it is needed (not `list` on
+    all namespaces or secrets)
+    """
+    from kubernetes.client.rest import ApiException
+    api = _get_k8s_client()
+    try:
+        if item_type == "namespace":
+            api.read_namespace(item_name, _request_timeout=METADATA_CMD_TIMEOUT)
+        else:
+            api.read_namespaced_secret(item_name, namespace, _request_timeout=METADATA_CMD_TIMEOUT)
+    except ApiException as e:
+        if e.status == 404:
+            return False
+        raise  # Something else broke
+    return True
+
+
+def _is_extant_secret(namespace, secret_name) -> bool:
+    return _is_extant_k8s_item(namespace, 'secret', secret_name)
 
 
 def make_release_name(chart_name: str, env: str):
@@ -87,23 +166,28 @@ def make_release_name(chart_name: str, env: str):
 def write_wiz_config(dirpath: Path, config: dict):
     config_yml = dirpath / 'wiz.yaml'
     with open(config_yml, 'w') as fp:
-        yaml.dump(config, fp)
+        yaml_dump(config, fp)
+    _load_wiz_config_all.cache_clear()  # So the write is visible to later loads
 
 
-def load_wiz_config(dirpath: Path, key: Optional[str] = None):
-    config_yml = dirpath / 'wiz.yaml'
-
+@cache
+def _load_wiz_config_all(dirpath: Path) -> Tuple[dict, bool]:
+    """
+    The parsed wiz.yaml, and whether it was found at all
+    """
     try:
-        with open(config_yml, 'r') as fp:
-            config = yaml.safe_load(fp)
+        with open(dirpath / 'wiz.yaml', 'r') as fp:
+            return yaml_load(fp), True
     except FileNotFoundError:
-        did_find_config_file = False
-        config = {}
-    else:
-        did_find_config_file = True
+        return {}, False
+
+
+def load_wiz_config(dirpath: Path, key: Optional[str] = None):
+    config_yml = dirpath / 'wiz.yaml'
+    config, did_find_config_file = _load_wiz_config_all(dirpath)
 
     if not key:
-        return config
+        return dict(config)  # A copy, callers may modify it
 
     if config.get(key) is None:
         if did_find_config_file:
@@ -132,18 +216,68 @@ def load_namespace_from_config(dirpath: Path):
     return load_wiz_config_key_or_prompt(dirpath, 'namespace')
 
 
-def make_envsecret_name(env: str, env_var_name: str):
-    env_var_slug = env_var_name.lower().replace('_', '-')
-    return f"envsecret-{env}-{env_var_slug}"
+@dataclass(frozen=True)
+class WizContext:
+    """
+    The wiz env dir a command runs against, built once by `cli` and handed
+    to subcommands with `click.pass_obj`. The config values are loaded on
+    first access (the loaders are cached), so `setup` can run before
+    they're configured
+    """
+    dirpath: Path
+
+    @property
+    def env(self) -> str:
+        return load_wiz_config(self.dirpath, "envName")
+
+    @property
+    def namespace(self) -> str:
+        return load_namespace_from_config(self.dirpath)
+
+    @property
+    def chart_name(self) -> str:
+        return _get_helm_chart_name(self.dirpath)
+
+    @property
+    def release_name(self) -> str:
+        return make_release_name(self.chart_name, self.env)
+
+    @property
+    def image_pull_secret(self) -> str:
+        return load_wiz_config(self.dirpath, "imagePullSecret")
+
+
+def load_dotenv(dotenv_file) -> Dict[str, str]:
+    """
+    `dotenv_values(dotenv_file)`, memoized on the file's mtime. A rewrite
+    that leaves the mtime unchanged (within one timestamp tick, or with
+    the mtime reset) returns the stale values
+    """
+    try:
+        mtime_ns = os.stat(dotenv_file).st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    return _load_dotenv(str(dotenv_file), mtime_ns)
+
 
+@cache
+def _load_dotenv(dotenv_file: str, mtime_ns: Optional[int]) -> Dict[str, str]:
+    from dotenv import dotenv_values
+    return dict(dotenv_values(dotenv_file))
 
-def make_envsecret(env: str, env_var_name: str):
+
+def make_envsecret_name(env: str):
+    # All of an env's ENV_VARs live as keys of this one secret
+    return f"envsecret-{env}"
+
+
+def make_envsecret(envsecret_name: str, env_var_name: str):
     return {
         "name": env_var_name,
         "valueFrom": {
             "secretKeyRef": {
-                "key": GENERIC_SECRET_FIELD_NAME,
-                "name": make_envsecret_name(env, env_var_name)
+                "key": env_var_name,
+                "name": envsecret_name
             }
         }
     }
@@ -151,8 +285,7 @@ def make_envsecret(env: str, env_var_name: str):
 
 
 def make_mntsecret_name(env: str, filepath: str):
-    slug = ''.join(
-        x if x in VOL_MNT_WHITELIST else '-' for x in filepath.lower())
+    slug = filepath.lower().translate(_VOL_MNT_SLUG_TABLE)
     return f"mntsecret-{env}-{slug}"
 
 
@@ -172,51 +305,90 @@ def make_mntsecret_volume_data(env: str, mntdir: str):
     return vol, vol_mnt
 
 
-def _set_secret_multi_cmd(namespace, secret_name: str, secrets: Dict[str, str]):
+def _b64_secret_value(secret_value: bytes) -> str:
+    from base64 import b64encode
+    return b64encode(secret_value).decode('ascii')
 
-    print(f"{bcolors.OKBLUE}Will save secret '{secret_name}'{bcolors.ENDC}")
-    from_literals = [
-        f'--from-literal={secret_key}={secret_value}'
-        for secret_key, secret_value in secrets.items()
-    ]
 
-    out = exec_io(
-        'kubectl',
-        'create',
-        'secret',
-        f'--namespace={namespace}',
-        '--dry-run=client',
-        'generic',
-        '-o',
-        'yaml',
-        secret_name,
-        *from_literals,
-    )
-    exec_io(
-        'kubectl',
-        'apply',
-        '-f',
-        '-',
-        input=out
+def _make_secret_manifest(namespace, secret_name: str, data=None, string_data=None):
+    """
+    Render (but do not apply) a generic secret as a `V1Secret`. `data`
+    values must already be base64 encoded, `string_data` values are plain
+    """
+    from kubernetes import client as k8s_client
+    print(f"{bcolors.OKBLUE}Will save secret '{secret_name}'{bcolors.ENDC}")
+    return k8s_client.V1Secret(
+        metadata=k8s_client.V1ObjectMeta(name=secret_name, namespace=namespace),
+        type="Opaque",
+        data=data,
+        string_data=string_data,
     )
 
 
-def _set_secret_cmd(namespace, secret_name: str, secret_value: str):
-    return _set_secret_multi_cmd(namespace, secret_name, {"value": secret_value})
+def _render_secret_from_literals(namespace, secret_name: str, secrets: Dict[str, str]):
+    return _make_secret_manifest(namespace, secret_name, string_data=secrets)
+
+
+def _render_secret_from_files(namespace, secret_name: str, local_paths: Dict[str, str]):
+    """
+    Like `_render_secret_from_literals` but each value is the contents of
+    a local file. Files are encoded as they are read, so only one file's
+    raw bytes are held at a time
+    """
+    return _make_secret_manifest(namespace, secret_name, data={
+        # Read raw bytes so binary files (keystores, certs) survive intact
+        secret_key: _b64_secret_value(Path(local_path).read_bytes())
+        for secret_key, local_path in local_paths.items()
+    })
+
+
+def _apply_secret_manifest(manifest, merge: bool = False):
+    """
+    Create the secret, or replace it if it exists. With `merge`, the keys
+    of an existing secret are kept and only the given ones are updated
+    """
+    from kubernetes.client.rest import ApiException
+    api = _get_k8s_client()
+    secret_name = manifest.metadata.name
+    namespace = manifest.metadata.namespace
+    try:
+        if merge:
+            api.patch_namespaced_secret(
+                secret_name, namespace, manifest, _request_timeout=API_WRITE_TIMEOUT)
+        else:
+            api.replace_namespaced_secret(
+                secret_name, namespace, manifest, _request_timeout=API_WRITE_TIMEOUT)
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        api.create_namespaced_secret(namespace, manifest, _request_timeout=API_WRITE_TIMEOUT)
 
 
-def _is_extant_secret(secret_name) -> bool:
+def _apply_manifests(manifests: list, merge: bool = False):
+    """
+    Apply all the secret manifests, several at a time, over the shared
+    API client's connection pool
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from functools import partial
+    if not manifests:
+        return
+    # `cache` doesn't lock, so build the client here rather than have every
+    # worker load kubeconfig (and run its auth plugin) at once
+    _get_k8s_client()
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_API_CALLS) as executor:
+        list(executor.map(partial(_apply_secret_manifest, merge=merge), manifests))
+
 
-    proc = subprocess.run([
-        'kubectl', 'get', 'secret', secret_name
-    ], capture_output=True, timeout=30)
-    if proc.returncode == 0:
-        return True
-    if 'Error from server (NotFound)' in proc.stderr.decode('utf8'):
-        return False
-    proc.check_returncode()  # Something else broke
+def _set_secret_from_literals(namespace, secret_name: str, secrets: Dict[str, str], merge: bool = False):
+    _apply_secret_manifest(_render_secret_from_literals(namespace, secret_name, secrets), merge=merge)
 
 
+def _set_secret_cmd(namespace, secret_name: str, secret_value: str):
+    return _set_secret_from_literals(namespace, secret_name, {"value": secret_value})
+
+
+@cache
 def _get_helm_chart_dir(dirpath: Path):
     dirpath = dirpath / '..'
     while not (dirpath / 'Chart.yaml').is_file():
@@ -227,45 +399,95 @@ def _get_helm_chart_dir(dirpath: Path):
         dirpath = parentdir
     return dirpath.resolve()
 
+@cache
 def _get_helm_chart_name(dirpath: Path):
     helm_chart_dir= _get_helm_chart_dir(dirpath)
     with open(helm_chart_dir / "Chart.yaml") as fp:
-        chart = yaml.safe_load(fp)
+        chart = yaml_load(fp)
     return chart["name"]
 
-def _release_create(image: str):
+def _helm_deps_fingerprint(helm_chart_dir: Path) -> str:
+    mtimes = []
+    for filename in ("Chart.yaml", "Chart.lock"):
+        try:
+            mtimes.append(str((helm_chart_dir / filename).stat().st_mtime_ns))
+        except FileNotFoundError:
+            mtimes.append("-")
+    return ":".join(mtimes)
+
+
+def _get_cache_dir() -> Path:
+    # Raises RuntimeError/KeyError if there's no HOME and no passwd entry
+    # (arbitrary-uid containers), so only resolved when actually needed
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "wizk8s"
+
+
+def _helm_dependency_update(helm_chart_dir: Path):
     '''
-    Create a helm release from values.yml generated from the wiz env dir
-    (and the helm chart which must be in the parent directory from the wiz env dir)
+    Run `helm dependency update` unless Chart.yaml and Chart.lock are
+    unchanged since the last time we ran it for this chart
     '''
-    dirpath = Path(GLOBALS["dirpath"])
-    values = _wiz_genvalues(dirpath)
+    import hashlib
+    chart_dir_hash = hashlib.sha1(str(helm_chart_dir).encode('utf8')).hexdigest()
 
-    namespace = load_namespace_from_config(dirpath)
-    env = load_wiz_config(dirpath, "envName")
+    # The stamp is only an optimization, so an unreadable or unwritable
+    # cache dir (e.g. read-only HOME in CI) must not fail the deploy
+    try:
+        stamp_file = _get_cache_dir() / f"deps-{chart_dir_hash}"
+    except (RuntimeError, KeyError) as e:
+        verbose_print(f"Could not find a cache dir for chart dependencies stamp: {e!r}")
+        stamp_file = None
 
-    helm_chart_dir = _get_helm_chart_dir(dirpath)
-    chart_name = _get_helm_chart_name(dirpath)
-    release_name = make_release_name(chart_name, env)
+    try:
+        if stamp_file and stamp_file.read_text() == _helm_deps_fingerprint(helm_chart_dir):
+            verbose_print(f"Chart dependencies unchanged, skipping update ({stamp_file})")
+            return
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        verbose_print(f"Could not read chart dependencies stamp: {e}")
 
-    print(f'{bcolors.OKCYAN}Deploying image="{image}" as release="{release_name}"\n{bcolors.ENDC}')
     exec(
         "helm", "dependency", "update", str(helm_chart_dir)
     )
+    if stamp_file is None:
+        return
+    try:
+        stamp_file.parent.mkdir(parents=True, exist_ok=True)
+        # Fingerprint after the update, since it rewrites Chart.lock
+        stamp_file.write_text(_helm_deps_fingerprint(helm_chart_dir))
+    except OSError as e:
+        verbose_print(f"Could not write chart dependencies stamp: {e}")
+
+
+def _release_create(wiz: WizContext, image: str):
+    '''
+    Create a helm release from values.yml generated from the wiz env dir
+    (and the helm chart which must be in the parent directory from the wiz env dir)
+    '''
+    values = _wiz_genvalues(wiz)
 
-    with NamedTemporaryFile('w') as values_file:
-        json.dump(values, values_file)
-        values_file.flush()
-        exec(
-            "helm",
-            "upgrade",  # Perform install or upgrade
-            "--create-namespace",  # Create namespace if it doesnt exist
-            f"--namespace={namespace}",
-            "--install", release_name,
-            str(helm_chart_dir),
-            "--set", f"image={image}",
-            f"--values={values_file.name}",
-        )
+    helm_chart_dir = _get_helm_chart_dir(wiz.dirpath)
+    release_name = wiz.release_name
+
+    print(f'{bcolors.OKCYAN}Deploying image="{image}" as release="{release_name}"\n{bcolors.ENDC}')
+    _helm_dependency_update(helm_chart_dir)
+
+    # Values go to helm over stdin, no temp file needed
+    values_yaml = yaml_dump(values, None, default_flow_style=False)
+    exec(
+        "helm",
+        "upgrade",  # Perform install or upgrade
+        "--create-namespace",  # Create namespace if it doesnt exist
+        f"--namespace={wiz.namespace}",
+        "--install", release_name,
+        "--dependency-update",  # Fetch deps if charts/ is missing them
+        str(helm_chart_dir),
+        "--set", f"image={image}",
+        "--values=-",
+        input=values_yaml.encode('utf8'),
+    )
 
 
 # CLI
@@ -273,7 +495,8 @@ def _release_create(image: str):
 @click.group()
 @click.option("--verbose", is_flag=True)
 @click.option("--dirpath", help="The path to the wiz env dir")
-def cli(verbose, dirpath):
+@click.pass_context
+def cli(ctx, verbose, dirpath):
     GLOBALS["verbose"] = verbose
 
     if not dirpath:
@@ -285,39 +508,41 @@ def cli(verbose, dirpath):
             dirpath = cwd
         else:
             raise click.exceptions.UsageError("You must specify --dirpath (or cd to the wiz env dir)")
-    
-    GLOBALS["dirpath"] = dirpath
+
+    ctx.obj = WizContext(Path(dirpath))
 
 
 @cli.command("info")
-def sync_cmd():
+@click.pass_obj
+def sync_cmd(wiz: WizContext):
     """
     Get info about this wiz dir env (and other context)
     """
-    dirpath = Path(GLOBALS["dirpath"])
-    env = load_wiz_config(dirpath, "envName")
-    namespace = load_namespace_from_config(dirpath)
-    chart_name = _get_helm_chart_name(dirpath)
     cluster_name = exec_io('kubectl', 'config', 'current-context').decode('utf8').strip()
     
     print(f"cluster: {cluster_name}")
-    print(f"namespace: {namespace}")
-    print(f"release_name: {make_release_name(chart_name, env)}")
+    print(f"namespace: {wiz.namespace}")
+    print(f"release_name: {wiz.release_name}")
 
 
 def _set_docker_registry_secret(namespace, hostname, secret_name, email, username, password):
-    exec(
-        "kubectl",
-        f"--namespace={namespace}",
-        "create",
-        "secret",
-        "docker-registry",
-        secret_name,
-        "--docker-server={hostname}",
-        f"--docker-username={username}",
-        f"--docker-password={password}",
-        f"--docker-email={email}"
-    )
+    import json
+    from kubernetes import client as k8s_client
+    docker_config = {
+        "auths": {
+            hostname: {
+                "username": username,
+                "password": password,
+                "email": email,
+                "auth": _b64_secret_value(f"{username}:{password}".encode('utf8')),
+            }
+        }
+    }
+    _get_k8s_client().create_namespaced_secret(namespace, k8s_client.V1Secret(
+        metadata=k8s_client.V1ObjectMeta(name=secret_name, namespace=namespace),
+        type="kubernetes.io/dockerconfigjson",
+        string_data={".dockerconfigjson": json.dumps(docker_config)},
+    ), _request_timeout=API_WRITE_TIMEOUT)
 
 
 @cli.group("releases")
@@ -328,45 +553,36 @@ def release_cli():
 
 
 @release_cli.command('nuke')
-def nuke_cmd():
-    dirpath = Path(GLOBALS["dirpath"])
-    env = load_wiz_config(dirpath, "envName")
-    namespace = load_namespace_from_config(dirpath)
-    chart_name = _get_helm_chart_name(dirpath)
+@click.pass_obj
+def nuke_cmd(wiz: WizContext):
     exec(
         "helm",
         "uninstall",
-        f"--namespace={namespace}",
-        make_release_name(chart_name, env)
+        f"--namespace={wiz.namespace}",
+        wiz.release_name
     )
 
 
 @release_cli.command('list')
-def list_cmd():
-    dirpath = Path(GLOBALS["dirpath"])
-    env = load_wiz_config(dirpath, "envName")
-    namespace = load_namespace_from_config(dirpath)
-    chart_name = _get_helm_chart_name(dirpath)
+@click.pass_obj
+def list_cmd(wiz: WizContext):
     exec(
         "helm",
         "history",
-        f"--namespace={namespace}",
-        make_release_name(chart_name, env)
+        f"--namespace={wiz.namespace}",
+        wiz.release_name
     )
 
 
 @release_cli.command('rollback')
 @click.argument("revision")
-def rollback_cmd(revision):
-    dirpath = Path(GLOBALS["dirpath"])
-    env = load_wiz_config(dirpath, "envName")
-    namespace = load_namespace_from_config(dirpath)
-    chart_name = _get_helm_chart_name(dirpath)
+@click.pass_obj
+def rollback_cmd(wiz: WizContext, revision):
     exec(
         "helm",
         "rollback",
-        f"--namespace={namespace}",
-        make_release_name(chart_name, env),
+        f"--namespace={wiz.namespace}",
+        wiz.release_name,
         revision
     )
 
@@ -379,117 +595,119 @@ def secret_cli():
 
 
 @secret_cli.command('list')
-def list_cmd():
-    namespace = load_namespace_from_config(Path(GLOBALS["dirpath"]))
-    exec(
-        'kubectl',
-        'get',
-        'secret',
-        f'--namespace={namespace}'
-    )
+@click.pass_obj
+def list_cmd(wiz: WizContext):
+    namespace = wiz.namespace
+    secrets = _get_k8s_client().list_namespaced_secret(
+        namespace, _request_timeout=METADATA_CMD_TIMEOUT).items
+    name_width = max([len("NAME")] + [len(secret.metadata.name) for secret in secrets])
+    type_width = max([len("TYPE")] + [len(secret.type) for secret in secrets])
+    print(f"{'NAME':<{name_width}}   {'TYPE':<{type_width}}   DATA")
+    for secret in secrets:
+        print(f"{secret.metadata.name:<{name_width}}   {secret.type:<{type_width}}   {len(secret.data or {})}")
 
 
 @secret_cli.command('set')
 @click.argument("secret_name")
 @click.argument("secret_value")
-def set_secret_cmd(secret_name, secret_value):
-    namespace = load_namespace_from_config(Path(GLOBALS["dirpath"]))
+@click.pass_obj
+def set_secret_cmd(wiz: WizContext, secret_name, secret_value):
+    namespace = wiz.namespace
     _set_secret_cmd(namespace, secret_name, secret_value)
 
 
 @secret_cli.command('get')
 @click.option('--no-parse', is_flag=True)
 @click.argument("secret_name")
-def get_secret_cmd(no_parse, secret_name):
-    namespace = load_namespace_from_config(Path(GLOBALS["dirpath"]))
-    extras = [
-        # data.value must match the GENERIC_SECRET_FIELD_NAME!
-        "-o=jsonpath='{.data}'"] if no_parse else ["-o=jsonpath='{.data.value}'"]
-    output = exec_io(
-        "kubectl",
-        "get",
-        "secret",
-        f'--namespace={namespace}',
-        secret_name,
-        *extras)
+@click.pass_obj
+def get_secret_cmd(wiz: WizContext, no_parse, secret_name):
+    from base64 import b64decode
+    namespace = wiz.namespace
+    secret = _get_k8s_client().read_namespaced_secret(
+        secret_name, namespace, _request_timeout=METADATA_CMD_TIMEOUT)
+    data = secret.data or {}
     if no_parse:
-        print(output.decode('utf8'))
+        import json
+        print(json.dumps(data))
+    elif GENERIC_SECRET_FIELD_NAME not in data:
+        raise click.exceptions.UsageError(
+            f"Secret '{secret_name}' has no '{GENERIC_SECRET_FIELD_NAME}' key, use --no-parse to see all of its data")
     else:
-        print(b64decode(output).decode('utf8'))
+        print(b64decode(data[GENERIC_SECRET_FIELD_NAME]).decode('utf8'))
 
 
 @secret_cli.command('rm')
 @click.argument("secret_name")
-def rm_secret_cmd(secret_name):
-    namespace = load_namespace_from_config(Path(GLOBALS["dirpath"]))
-    exec(
-        "kubectl",
-        "delete",
-        "secret",
-        f'--namespace={namespace}',
-        secret_name
-    )
+@click.pass_obj
+def rm_secret_cmd(wiz: WizContext, secret_name):
+    namespace = wiz.namespace
+    _get_k8s_client().delete_namespaced_secret(
+        secret_name, namespace, _request_timeout=METADATA_CMD_TIMEOUT)
 
 
 @secret_cli.command('set-as-envar')
 @click.argument("envvar_name")
 @click.argument("envvar_value")
-def set_envvar_cmd(envvar_name, envvar_value):
+@click.pass_obj
+def set_envvar_cmd(wiz: WizContext, envvar_name, envvar_value):
     """
     Set the ENV_VAR as a secret
     """
-    dirpath = Path(GLOBALS["dirpath"])
-    env = load_wiz_config(dirpath, "envName")
-    namespace = load_namespace_from_config(dirpath)
-    secret_name = make_envsecret_name(env, envvar_name)
-    _set_secret_cmd(namespace, secret_name, envvar_value)
+    # Merged into the env's secret; the other ENV_VARs are left as is
+    _set_secret_from_literals(
+        wiz.namespace, make_envsecret_name(wiz.env), {envvar_name: envvar_value}, merge=True)
+
 
+def _render_envfile(namespace, env, dotenv_file) -> list:
 
-def _push_envfile(namespace, env, dotenv_file):
+    dotenv_vals = load_dotenv(dotenv_file)
 
-    dotenv_vals: Dict[str, str] = dotenv_values(dotenv_file)
+    if not dotenv_vals:
+        return []
+    return [_render_secret_from_literals(namespace, make_envsecret_name(env), dotenv_vals)]
 
-    for envvar_name, envvar_value in dotenv_vals.items():
-        secret_name = make_envsecret_name(env, envvar_name)
-        _set_secret_cmd(namespace, secret_name, envvar_value)
+
+def _push_envfile(namespace, env, dotenv_file, merge: bool = False):
+    _apply_manifests(_render_envfile(namespace, env, dotenv_file), merge=merge)
 
 
 @secret_cli.command('set-from-env-file')
 @click.argument("dotenv_file")
-def set_envvar_cmd(dotenv_file):
+@click.pass_obj
+def set_envvar_cmd(wiz: WizContext, dotenv_file):
     """
     Set all the ENV_VAR values in the given files as secrets
     """
-    dirpath = Path(GLOBALS["dirpath"])
-    env = load_wiz_config(dirpath, "envName")
-    namespace = load_namespace_from_config(dirpath)
-    return _push_envfile(namespace, env, dotenv_file)
+    # Merged into the env's secret, like `set-as-envar`; only `push` (where
+    # .env is the whole truth) replaces it
+    return _push_envfile(wiz.namespace, wiz.env, dotenv_file, merge=True)
 
 
-def _set_files_as_secret(namespace, env, remote_dir, file_metas: List[MntSecretFileMeta]):
+def _render_files_as_secret(namespace, env, remote_dir, file_metas: List[MntSecretFileMeta]):
 
     if not remote_dir:
         raise RuntimeError(
             "You must specify a full remote path, not just a filename")
 
     secret_name = make_mntsecret_name(env, remote_dir)
-    secret_contents = {}
+    local_paths = {}
 
     for filemeta in file_metas:
         local_filepath = filemeta["local_path"]
-        with open(local_filepath, 'r') as fp:
-            contents = fp.read()
-        secret_contents[filemeta["filename"]] = contents
+        local_paths[filemeta["filename"]] = local_filepath
         print(
             f"{bcolors.OKBLUE}Will make local file '{local_filepath}' available in dir '{remote_dir}' as '{filemeta['filename']}'{bcolors.ENDC}")
 
-    _set_secret_multi_cmd(namespace, secret_name, secret_contents)
+    return _render_secret_from_files(namespace, secret_name, local_paths)
+
+
+def _set_files_as_secret(namespace, env, remote_dir, file_metas: List[MntSecretFileMeta]):
+    _apply_manifests([_render_files_as_secret(namespace, env, remote_dir, file_metas)])
 
 
 def _set_file_as_secret(namespace, env, remote_filepath, local_filepath):
 
-    dirname = os.path.dirname(remote_filepath)
-    basename = os.path.basename(remote_filepath)
+    dirname, basename = os.path.split(remote_filepath)
     _set_files_as_secret(namespace, 
         env, dirname, [{"filename": basename, "local_path": local_filepath}])
 
@@ -497,47 +715,61 @@ def _set_file_as_secret(namespace, env, remote_filepath, local_filepath):
 @secret_cli.command("set")
 @click.argument("local_filepath")
 @click.argument("remote_filepath")
-def set_mntsecret(local_filepath, remote_filepath):
+@click.pass_obj
+def set_mntsecret(wiz: WizContext, local_filepath, remote_filepath):
     """
     Save contents of local file as a volume-mountable-secret 
     """
-    dirpath = Path(GLOBALS["dirpath"])
-    env = load_wiz_config(dirpath, "envName")
-    namespace = load_namespace_from_config(dirpath)
-    _set_file_as_secret(namespace, env, remote_filepath, local_filepath)
+    _set_file_as_secret(wiz.namespace, wiz.env, remote_filepath, local_filepath)
 
 
 def _get_file_metas(dirpath: Path) -> Dict[str, List[MntSecretFileMeta]]:
+    """
+    Secret files under `dirpath`, bucketed by remote dir
+    """
+    from collections import defaultdict
 
     dir_bucket = defaultdict(list)
-
-    for local_path in dirpath.rglob('*'):
-        if local_path.is_dir():
-            continue
-
-        remote_path = Path(str(local_path).split(str(dirpath))[1])
-        dir_bucket[str(remote_path.parent)].append(MntSecretFileMeta(
-            filename=local_path.name,
-            local_path=str(local_path),
-        ))
+    root = str(dirpath)
+    if not os.path.isdir(root):
+        return {}
+
+    # os.scandir's entries know their own type, so no per-entry stat.
+    # Each dir carries its remote path (absolute, rooted at `dirpath`)
+    dirs_to_scan = [(root, "/")]
+    while dirs_to_scan:
+        local_dir, remote_dir = dirs_to_scan.pop()
+        with os.scandir(local_dir) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs_to_scan.append((entry.path, os.path.join(remote_dir, entry.name)))
+                elif entry.is_file():
+                    dir_bucket[remote_dir].append(MntSecretFileMeta(
+                        filename=entry.name,
+                        local_path=entry.path,
+                    ))
     return dict(dir_bucket)
 
 
 @cli.command("setup")
-def wiz_setup():
+@click.pass_obj
+def wiz_setup(wiz: WizContext):
     """
     Do initial setup for config
     """
 
-    dirpath = Path(GLOBALS["dirpath"])
-
-    config = load_wiz_config(dirpath)
+    dirpath = wiz.dirpath
 
     print("Ensuring namespace is setup", file=sys.stderr)
-    namespace = load_namespace_from_config(dirpath)
-    if not _is_extant_k8s_item("namespace", namespace):
+    namespace = wiz.namespace
+    if not _is_extant_k8s_item(namespace, "namespace", namespace):
         print("Creating namespace", file=sys.stderr)
-        exec("kubectl", "create", "namespace", namespace)
+        from kubernetes import client as k8s_client
+        _get_k8s_client().create_namespace(k8s_client.V1Namespace(
+            metadata=k8s_client.V1ObjectMeta(name=namespace)), _request_timeout=API_WRITE_TIMEOUT)
+
+    # Loaded after the namespace prompt, which may have written the config
+    config = load_wiz_config(dirpath)
 
     # Handle env name
     print("Ensuring envName is setup", file=sys.stderr)
@@ -552,13 +784,13 @@ def wiz_setup():
     print("Ensuring imagePullSecret is setup", file=sys.stderr)
     image_pull_secret_name = config.get('imagePullSecret')
     if not image_pull_secret_name:
-        randstr = ''.join(random.choices(
-            string.ascii_lowercase + string.digits, k=5))
+        from secrets import token_hex
+        randstr = token_hex(3)[:5]
         image_pull_secret_name = f'wiz-setup-imagepullsecret-{env}-{randstr}'
         config['imagePullSecret'] = image_pull_secret_name
         write_wiz_config(dirpath, config)
 
-    if not _is_extant_secret(image_pull_secret_name):
+    if not _is_extant_secret(namespace, image_pull_secret_name):
         print(
             f"Docker Registry Secret '{image_pull_secret_name}' does not exist. Creating it...")
         print("(For Github password user a Personal Access Token: https://github.com/settings/tokens)")
@@ -571,69 +803,64 @@ def wiz_setup():
 
 
 @cli.command("push")
-def wiz_push():
+@click.pass_obj
+def wiz_push(wiz: WizContext):
     '''
     Push the current config
     '''
-    dirpath = Path(GLOBALS["dirpath"])
-    env = load_wiz_config(dirpath, "envName")
-    namespace = load_namespace_from_config(dirpath)
+    env = wiz.env
+    namespace = wiz.namespace
 
     # Handle push .env file
-    dotenv_file = dirpath / '.env'
-    _push_envfile(namespace, env, str(dotenv_file))
+    dotenv_file = wiz.dirpath / '.env'
+    manifests = _render_envfile(namespace, env, str(dotenv_file))
 
     # Handle secret files for mnting
-    for remote_dir, file_metas in _get_file_metas(dirpath / 'secretfiles').items():
-        _set_files_as_secret(namespace, env, remote_dir, file_metas)
+    for remote_dir, file_metas in _get_file_metas(wiz.dirpath / 'secretfiles').items():
+        manifests.append(_render_files_as_secret(namespace, env, remote_dir, file_metas))
 
+    # Push everything
+    _apply_manifests(manifests)
 
-def _wiz_genvalues(dirpath: str):
-    dirpath = Path(dirpath)
 
-    env = load_wiz_config(dirpath, "envName")
-    image_pull_secret_name = load_wiz_config(dirpath, "imagePullSecret")
+def _wiz_genvalues(wiz: WizContext):
+    env = wiz.env
+    envsecret_name = make_envsecret_name(env)
 
-    dotenv_file = dirpath / '.env'
-    dotenv_vals: Dict[str, str] = dotenv_values(dotenv_file)
-
-    values = {}
-    envs = [make_envsecret(env, env_name) for env_name in dotenv_vals.keys()]
-
-    vols = []
-    vol_mnts = []
-
-    for remote_dir, file_metas in _get_file_metas(dirpath / 'secretfiles').items():
-        vol, vol_mnt = make_mntsecret_volume_data(env, remote_dir)
-        vols.append(vol)
-        vol_mnts.append(vol_mnt)
+    dotenv_file = wiz.dirpath / '.env'
+    vol_datas = [
+        make_mntsecret_volume_data(env, remote_dir)
+        for remote_dir in _get_file_metas(wiz.dirpath / 'secretfiles')
+    ]
 
     values = {
-        "env": envs,
-        "volumes": vols,
-        "volumeMounts": vol_mnts,
-        "imagePullSecrets": [{"name": image_pull_secret_name}]
+        "env": [make_envsecret(envsecret_name, env_name) for env_name in load_dotenv(dotenv_file)],
+        "volumes": [vol for vol, _ in vol_datas],
+        "volumeMounts": [vol_mnt for _, vol_mnt in vol_datas],
+        "imagePullSecrets": [{"name": wiz.image_pull_secret}]
     }
 
     return values
 
 
 @cli.command("genvalues")
-def wiz_genvalues():
+@click.pass_obj
+def wiz_genvalues(wiz: WizContext):
     '''
     Print the values.yml generated from current config
     '''
-    values = _wiz_genvalues(GLOBALS["dirpath"])
-    yaml.dump(values, sys.stdout)
+    values = _wiz_genvalues(wiz)
+    yaml_dump(values, sys.stdout)
 
 
 @cli.command("deploy")
 @click.argument("image")
-def wiz_deploy(image):
+@click.pass_obj
+def wiz_deploy(wiz: WizContext, image):
     """
     Create a new release
     """
-    _release_create(image)
+    _release_create(wiz, image)
 
 
 cli.add_command(release_cli)